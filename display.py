@@ -30,11 +30,11 @@ def main():
 
     total = 0
     for i, rec in enumerate(records, start=1):
-        amt = rec["amount"]
+        amt = rec.amount
         total += amt
         # format amount with dollar sign and commas
         amt_str = f"${amt:,.2f}" if amt >= 0 else f"-${abs(amt):,.2f}"
-        print(f"  {i:<5} {rec['id']:<12} {rec['name']:<22} {amt_str:>10}   {rec['text']}")
+        print(f"  {i:<5} {rec.id:<12} {rec.name:<22} {amt_str:>10}   {rec.text}")
 
     print(f"\n  {'-'*72}")
     total_str = f"${total:,.2f}" if total >= 0 else f"-${abs(total):,.2f}"
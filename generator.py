@@ -5,12 +5,16 @@ the format commonly found on legacy IBM mainframe systems.
 """
 
 import random
-import codecs
 from faker import Faker
 
 # Initialize faker for generating realistic names
 fake = Faker()
 
+# ASCII/Latin-1 -> EBCDIC (cp037) translation table, built once at import.
+# cp037 is a single-byte code page covering all of Latin-1, so bytes.translate()
+# gives the same bytes as codecs.encode(..., "cp037") without the codec dispatch.
+LATIN1_TO_CP037 = bytes.maketrans(bytes(range(256)), bytes(range(256)).decode("latin1").encode("cp037"))
+
 
 def pack_comp3(number):
     """Pack a number into IBM COMP-3 format (Packed Decimal).
@@ -22,29 +26,28 @@ def pack_comp3(number):
         number: Integer value to pack
         
     Returns:
-        bytearray: The packed binary representation
+        bytes: The packed binary representation (always 3 bytes: 5 digits + sign)
+
+    Raises:
+        ValueError: If the number needs more than 5 digits
     """
-    # Convert number to string digits, padded to 5 digits (fills 3 bytes with sign nibble)
-    digit_string = str(abs(number)).zfill(5)
-
-    # Pack pairs of digits into bytes: '123' -> 0x12, 0x3C
-    # Each byte contains two decimal digits in hexadecimal form
-    packed = bytearray()
-    for i in range(0, len(digit_string) - 1, 2):
-        # Combine two adjacent digits and convert hex string to byte value
-        byte_value = int(digit_string[i] + digit_string[i+1], 16)
-        packed.append(byte_value)
-
-    # Append the sign nibble: 0xC (positive) or 0xD (negative)
-    # Format: last_digit=4 high bits, sign=4 low bits
-    last_digit = int(digit_string[-1])
-    sign_nibble = 0xC if number >= 0 else 0xD  # C=positive, D=negative
-    last_byte = (last_digit << 4) | sign_nibble  # Shift digit left 4 bits and OR with sign
-    packed.append(last_byte)
-
-    return packed
-
-def create_ebcdic_record(record_id, name, amount, log_text):
+    # Anything wider would spill into the first digit nibble and corrupt the record
+    if not -99999 <= number <= 99999:
+        raise ValueError(f"{number} does not fit in a 3-byte COMP-3 field (max 5 digits)")
+
+    # Peel off the 5 decimal digits with integer math: no string round-trip
+    rest, d4 = divmod(abs(number), 10)
+    rest, d3 = divmod(rest, 10)
+    rest, d2 = divmod(rest, 10)
+    d0, d1 = divmod(rest, 10)
+
+    # Sign nibble without a branch: 0xC (positive) or 0xD (negative)
+    sign_nibble = 0xC | (number < 0)
+
+    # Two digits per byte (high nibble, low nibble); the last byte is digit + sign
+    return bytes(((d0 << 4) | d1, (d2 << 4) | d3, (d4 << 4) | sign_nibble))
+
+def create_ebcdic_record(record_id, name, amount, log_text, out=None):
     """Create a binary transaction record in legacy mainframe format.
     
     Combines multiple fields with different encodings:
@@ -57,47 +60,55 @@ def create_ebcdic_record(record_id, name, amount, log_text):
         name: Customer/entity name (padded to 20 chars)
         amount: Transaction amount in cents/smallest unit (packed as COMP-3)
         log_text: Transaction log/status message (padded to 50 chars)
+        out: Optional bytearray to append the record to in place
         
     Returns:
-        bytes: Complete EBCDIC/binary record concatenated together
+        bytes: Complete EBCDIC/binary record concatenated together,
+        or `out` itself when a buffer was passed in
     """
-    # Convert and pad ID: text to EBCDIC encoding, left-aligned in 10 chars
-    id_bytes = codecs.encode(f"{record_id:<10}"[:10], "cp037")
-
-    # Convert and pad name: text to EBCDIC encoding, left-aligned in 20 chars
-    name_bytes = codecs.encode(f"{name:<20}"[:20], "cp037")
+    # ID and name are adjacent text fields: pad/truncate both with one format
+    # string ("!s:<10.10" = str(), left-align in 10, cut at 10) and translate in one pass
+    head_bytes = f"{record_id!s:<10.10}{name!s:<20.20}".encode("latin1").translate(LATIN1_TO_CP037)
 
     # Convert amount: integer to packed decimal (COMP-3 binary format)
     amount_bytes = pack_comp3(amount)
 
     # Convert and pad log message: text to EBCDIC encoding, left-aligned in 50 chars
-    log_bytes = codecs.encode(f"{log_text:<50}"[:50], "cp037")
+    log_bytes = f"{log_text!s:<50.50}".encode("latin1").translate(LATIN1_TO_CP037)
 
     # Concatenate all fields in order
-    return id_bytes + name_bytes + amount_bytes + log_bytes
+    if out is None:
+        return head_bytes + amount_bytes + log_bytes
+
+    # Or append them straight into the caller's buffer (no per-record bytes object)
+    out += head_bytes
+    out += amount_bytes
+    out += log_bytes
+    return out
 
 if __name__ == "__main__":
     print("Generating 'legacy_mainframe.dat'...")
     
-    # Create output file in binary write mode
+    # Generate 50 sample transaction records
+    records = bytearray()
+    for record_index in range(50):
+        # Randomly select log message: mix of debug and confirmation messages
+        if random.random() > 0.5:
+            transaction_log = "DEBUG: System dump memory leak at 0x000"
+        else:
+            transaction_log = "CONFIRM: Transaction verified for client"
+        
+        # Build the binary record with random data, appended to one buffer
+        create_ebcdic_record(
+            record_id=str(record_index),
+            name=fake.name(),
+            amount=random.randint(100, 9999),
+            log_text=transaction_log,
+            out=records
+        )
+    
+    # Write the whole buffer in a single call
     with open("legacy_mainframe.dat", "wb") as output_file:
-        # Generate 50 sample transaction records
-        for record_index in range(50):
-            # Randomly select log message: mix of debug and confirmation messages
-            if random.random() > 0.5:
-                transaction_log = "DEBUG: System dump memory leak at 0x000"
-            else:
-                transaction_log = "CONFIRM: Transaction verified for client"
-            
-            # Build the binary record with random data
-            record = create_ebcdic_record(
-                record_id=str(record_index),
-                name=fake.name(),
-                amount=random.randint(100, 9999),
-                log_text=transaction_log
-            )
-            
-            # Write the binary record to file
-            output_file.write(record)
+        output_file.write(records)
     
     print("Done. This file is now unreadable by standard text editors.")
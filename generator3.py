@@ -1,9 +1,12 @@
 import random
-import codecs
 from faker import Faker
 
 fake = Faker()
 
+# cp037 is single-byte and covers all of Latin-1, so one translate table
+# does what codecs.encode(..., "cp037") does, minus the codec lookup per call.
+LATIN1_TO_CP037 = bytes.maketrans(bytes(range(256)), bytes(range(256)).decode("latin1").encode("cp037"))
+
 
 def pack_comp3(number, width=3):
     """Turn a Python int into COMP-3 packed-decimal bytes.
@@ -11,18 +14,23 @@ def pack_comp3(number, width=3):
     COMP-3 squeezes two digits into each byte; the very last nibble
     stores the sign (C = positive, D = negative).  We zero-pad so the
     output is *always* exactly `width` bytes — otherwise the reader's
-    fixed-length slicing breaks.
+    fixed-length slicing breaks.  Numbers with more digits than fit
+    raise ValueError rather than silently losing the top ones.
     """
-    digits = str(abs(number)).zfill(width * 2 - 1)
-    packed = bytearray()
-    for i in range(0, len(digits) - 1, 2):
-        packed.append(int(digits[i] + digits[i + 1], 16))
-    sign = 0xC if number >= 0 else 0xD
-    packed.append((int(digits[-1]) << 4) | sign)
-    return packed
-
-
-def create_ebcdic_record(rec_id, name, amount, log_text):
+    if abs(number) >= 10 ** (2 * width - 1):
+        raise ValueError(f"{number} does not fit in {width} COMP-3 bytes")
+    n, last = divmod(abs(number), 10)
+    packed = bytearray(width)
+    packed[-1] = (last << 4) | 0xC | (number < 0)
+    # fill the remaining bytes right-to-left, two digits each, via divmod
+    for i in range(width - 2, -1, -1):
+        n, lo = divmod(n, 10)
+        n, hi = divmod(n, 10)
+        packed[i] = (hi << 4) | lo
+    return bytes(packed)
+
+
+def create_ebcdic_record(rec_id, name, amount, log_text, out=None):
     """Build one 83-byte record in mainframe format.
 
     Layout (the "copybook"):
@@ -30,13 +38,18 @@ def create_ebcdic_record(rec_id, name, amount, log_text):
       Name — 20 bytes, EBCDIC text
       Amt  —  3 bytes, COMP-3 packed decimal
       Log  — 50 bytes, EBCDIC text
+
+    Pass a bytearray as `out` to append the record to it in place
+    (it's returned back) instead of getting a fresh bytes object.
     """
-    return (
-        codecs.encode(f"{rec_id:<10}",   "cp037")
-        + codecs.encode(f"{name:<20}",   "cp037")
-        + pack_comp3(amount)
-        + codecs.encode(f"{log_text:<50}", "cp037")
-    )
+    head = f"{rec_id:<10}{name:<20}".encode("latin1").translate(LATIN1_TO_CP037)
+    log = f"{log_text:<50}".encode("latin1").translate(LATIN1_TO_CP037)
+    if out is None:
+        return head + pack_comp3(amount) + log
+    out += head
+    out += pack_comp3(amount)
+    out += log
+    return out
 
 
 # Log messages the AI will see once we decode them back to ASCII.
@@ -71,17 +84,24 @@ grey_area_logs = [
 # Write 50 records — roughly 35% junk, 30% important, 35% grey area
 print("Writing legacy_mainframe.dat ...")
 
+N = 50
+
+# Do all the dice rolls up front in a few random.choices calls instead of
+# several random.* calls per record. Each message's weight is its group's
+# share split evenly across the group, so the 35/30/35 mix is unchanged.
+all_logs, log_weights = [], []
+for group, share in ((junk_logs, 0.35), (important_logs, 0.30), (grey_area_logs, 0.35)):
+    all_logs += group
+    log_weights += [share / len(group)] * len(group)
+
+logs = random.choices(all_logs, weights=log_weights, k=N)
+amounts = random.choices(range(100, 10000), k=N)
+
+buf = bytearray()
+for i in range(N):
+    create_ebcdic_record(str(i), fake.name(), amounts[i], logs[i], out=buf)
+
 with open("legacy_mainframe.dat", "wb") as f:
-    for i in range(50):
-        roll = random.random()
-        if roll < 0.35:
-            log = random.choice(junk_logs)
-        elif roll < 0.65:
-            log = random.choice(important_logs)
-        else:
-            log = random.choice(grey_area_logs)
-
-        f.write(create_ebcdic_record(str(i), fake.name(),
-                                     random.randint(100, 9999), log))
-
-print("Done — 50 records ready.")
+    f.write(buf)
+
+print(f"Done — {N} records ready.")
@@ -1,36 +1,68 @@
 import codecs
+import mmap
+import os
+from collections import namedtuple
+from contextlib import contextmanager
 
 def unpack_comp3(raw):
     """COMP-3 packed decimal -> int"""
-    h = raw.hex()
-    sign = h[-1].upper()
-    # each nibble except the last is a decimal digit (0-9)
-    digits = "".join(c for c in h[:-1] if c.isdigit())
-    val = int(digits) if digits else 0
-    if sign == 'D':
-        val = -val
-    return val
-
-def parse_mainframe_file(file_path):
-    records = []
+    v = int.from_bytes(raw, "big")
+    sign = v & 0xF
+    # every nibble above the sign is a decimal digit, least significant first
+    val, scale = 0, 1
+    v >>= 4
+    while v:
+        digit = v & 0xF
+        if digit > 9:
+            raise ValueError(f"bad COMP-3 digit nibble {digit:X} in {bytes(raw).hex()}")
+        val += digit * scale
+        scale *= 10
+        v >>= 4
+    return -val if sign == 0xD else val
 
+# field names, in record order
+FIELDS = ("id", "name", "amount", "text")
+
+# one parsed record; a tuple, so no per-record dict
+Record = namedtuple("Record", FIELDS)
+
+def parse_mainframe_file(source):
+    """source can be a path, raw bytes/memoryview, or an open binary file"""
+    return list(iter_mainframe_records(source))
+
+def iter_mainframe_records(source):
+    """same as parse_mainframe_file, but lazily yields one Record at a time"""
     # layout: ID(10) | NAME(20) | AMT(3, packed) | LOG(50)
     rec_len = 83
 
-    with open(file_path, "rb") as f:
-        while chunk := f.read(rec_len):
-            if len(chunk) < rec_len:
-                break
+    with _open_buffer(source) as buf:
+        end = len(buf) - len(buf) % rec_len  # a trailing partial record is dropped
+
+        # decode all the text in one C pass instead of 3 codec calls per record;
+        # the packed amount bytes come out as junk here but are read from buf
+        text = codecs.decode(buf[:end], "cp037")
+
+        for off in range(0, end, rec_len):
             try:
-                rec_id = codecs.decode(chunk[0:10], "cp037").strip()
-                name = codecs.decode(chunk[10:30], "cp037").strip()
-                amt = unpack_comp3(chunk[30:33])
-                log = codecs.decode(chunk[33:83], "cp037").strip()
-
-                records.append({
-                    "id": rec_id, "name": name, "amount": amt, "text": log
-                })
+                amt = unpack_comp3(buf[off + 30:off + 33])
             except Exception as e:
                 print(f"bad record, skipping: {e}")
-                
-    return records
\ No newline at end of file
+                continue
+
+            yield Record(text[off:off + 10].strip(), text[off + 10:off + 30].strip(),
+                         amt, text[off + 33:off + rec_len].strip())
+
+@contextmanager
+def _open_buffer(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield memoryview(source)
+    elif hasattr(source, "read"):
+        yield memoryview(source.read())
+    else:
+        # map the file and decode straight from the map, no read() copy
+        with open(source, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:  # mmap can't map an empty file
+                yield memoryview(b"")
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as buf:
+                yield buf